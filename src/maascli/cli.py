@@ -4,7 +4,7 @@
 """CLI management commands."""
 
 
-from functools import partial
+from functools import lru_cache, partial
 import os
 import pkgutil
 import sys
@@ -302,10 +302,20 @@ def run_regiond_command(management, parser):
     management.execute_from_command_line()
 
 
+@lru_cache(maxsize=None)
+def load_command_class(management, app, name):
+    """Load the Django management command `name` from `app`.
+
+    Loading a command class imports its module and instantiates it, which is
+    relatively expensive, so the result is cached for the life of the process.
+    """
+    return management.load_command_class(app, name)
+
+
 def load_regiond_commands(management, parser):
     """Load the allowed regiond commands into the MAAS cli."""
     for name, app, help_text in regiond_commands:
-        klass = management.load_command_class(app, name)
+        klass = load_command_class(management, app, name)
         if help_text is None:
             help_text = klass.help
         command_parser = parser.subparsers.add_parser(
@@ -251,10 +251,27 @@ def print_msg(msg="", newline=True, stderr=False):
     print(msg, end=("\n" if newline else ""), flush=True, file=stream)
 
 
+def is_external_auth_disabled(options):
+    """Whether `options` explicitly configure MAAS without external auth.
+
+    In that case `configauth` doesn't prompt for anything and always leaves
+    the external authentication URL empty.
+    """
+    disabled = ("", "none")
+    return (
+        options.rbac_url in disabled and options.candid_agent_file in disabled
+    )
+
+
 def init_maas(options):
     print_msg("Configuring authentication")
     configure_authentication(options)
     if not options.skip_admin:
+        if is_external_auth_disabled(options):
+            # No need to start another maas-region process just to find out
+            # that external authentication isn't configured.
+            create_admin_account(options)
+            return
         auth_config = get_current_auth_config()
         if auth_config["external_auth_url"]:
             maas_config = MAASConfiguration().get()
@@ -21,9 +21,20 @@ from maastesting.factory import factory
 from maastesting.testcase import MAASTestCase
 
 
+EMPTY_AUTH_CONFIG = json.dumps({"external_auth_url": ""})
+
+
 class TestRegisterCommands(MAASTestCase):
     """Tests for registers CLI commands."""
 
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Tests that only inspect the result of registering commands share a
+        # single parser; tests that patch the environment build their own.
+        cls.parser = ArgumentParser()
+        cli.register_cli_commands(cls.parser)
+
     def test_registers_subparsers(self):
         parser = ArgumentParser()
         self.assertIsNone(parser._subparsers)
@@ -31,10 +42,8 @@ class TestRegisterCommands(MAASTestCase):
         self.assertIsNotNone(parser._subparsers)
 
     def test_subparsers_have_appropriate_execute_defaults(self):
-        parser = ArgumentParser()
-        cli.register_cli_commands(parser)
         self.assertIsInstance(
-            parser.subparsers.choices["login"].get_default("execute"),
+            self.parser.subparsers.choices["login"].get_default("execute"),
             cli.cmd_login,
         )
 
@@ -73,16 +82,25 @@ class TestRegisterCommands(MAASTestCase):
         )
 
     def test_loads_all_regiond_commands(self):
-        parser = ArgumentParser()
-        cli.register_cli_commands(parser)
         for name, app, help_text in cli.regiond_commands:
-            subparser = parser.subparsers.choices.get(name)
+            subparser = self.parser.subparsers.choices.get(name)
             klass = management.load_command_class(app, name)
             if help_text is None:
                 help_text = klass.help
             self.assertIsNotNone(subparser)
             self.assertEqual(help_text, subparser.description)
 
+    def test_load_regiond_commands_caches_command_classes(self):
+        self.addCleanup(cli.load_command_class.cache_clear)
+        cli.load_command_class.cache_clear()
+        mock_management = self.patch(management, "load_command_class")
+        for _ in range(2):
+            parser = ArgumentParser()
+            cli.load_regiond_commands(management, parser)
+        self.assertEqual(
+            len(cli.regiond_commands), mock_management.call_count
+        )
+
     def test_load_init_command_snap(self):
         environ = {"SNAP": "snap-path"}
         self.patch(os, "environ", environ)
@@ -161,6 +179,16 @@ class TestLogin(MAASTestCase):
 
 
 class TestCmdInit(MAASTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.devnull = open(os.devnull, "w")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.devnull.close()
+        super().tearDownClass()
+
     def setUp(self):
         super().setUp()
         self.parser = ArgumentParser()
@@ -168,12 +196,10 @@ class TestCmdInit(MAASTestCase):
         self.maas_region_path = init.get_maas_region_bin_path()
         self.call_mock = self.patch(init.subprocess, "call")
         self.check_output_mock = self.patch(init.subprocess, "check_output")
-        self.check_output_mock.return_value = json.dumps(
-            {"external_auth_url": ""}
-        )
+        self.check_output_mock.return_value = EMPTY_AUTH_CONFIG
         # avoid printouts
-        self.mock_stdout = self.patch(init.sys, "stdout", StringIO())
-        self.mock_stderr = self.patch(init.sys, "stderr", StringIO())
+        self.patch(init.sys, "stdout", self.devnull)
+        self.patch(init.sys, "stderr", self.devnull)
 
     def test_defaults(self):
         options = self.parser.parse_args([])
@@ -196,6 +222,16 @@ class TestCmdInit(MAASTestCase):
         self.assertEqual(([self.maas_region_path, "createadmin"],), args2)
         self.assertEqual({}, kwargs2)
 
+    def test_init_maas_skips_auth_lookup_without_external_auth(self):
+        options = self.parser.parse_args(
+            ["--rbac-url", "", "--candid-agent-file", "none"]
+        )
+        self.cmd(options)
+        self.check_output_mock.assert_not_called()
+        _, createadmin_call = self.call_mock.mock_calls
+        _, args, _ = createadmin_call
+        self.assertEqual([self.maas_region_path, "createadmin"], args[0])
+
 
 class TestReconfigureSupervisord(MAASTestCase):
     def test_cmd_configure_supervisord(self):
@@ -1,22 +1,66 @@
 # Copyright 2021 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
-import random
+from itertools import product
+from unittest.mock import MagicMock
 
 from django.http import Http404
 
+from maasserver.models import virtualmachine as virtualmachine_module
 from maasserver.models.virtualmachine import MB
 from maasserver.models.vmcluster import VMCluster
 from maasserver.permissions import VMClusterPermission
+from maasserver.rbac import rbac
 from maasserver.testing.factory import factory
 from maasserver.testing.fixtures import RBACEnabled
 from maasserver.testing.testcase import MAASServerTestCase
+from maastesting.djangotestcase import count_queries
+
+# Fixed sizes keep the storage tests deterministic. Shared and local sizes
+# differ so that mixing up the two kinds of pool changes the totals.
+SHARED_POOL_SIZE = 50 * 1024 ** 3
+SHARED_DISK_SIZE = 5 * 1024 ** 3
+LOCAL_POOL_SIZE = 20 * 1024 ** 3
+LOCAL_DISK_SIZE = 2 * 1024 ** 3
+
+
+def make_physical_cluster_pods(clusters, num_addresses=3):
+    """Make LXD pods so that `clusters` share the same physical hosts.
+
+    Each cluster gets one pod per address, so all of them end up grouped
+    together by `group_by_physical_cluster`.
+    """
+    addresses = [factory.make_ipv4_address() for _ in range(num_addresses)]
+    for cluster, address in product(clusters, addresses):
+        factory.make_Pod(
+            cluster=cluster,
+            parameters={
+                "project": cluster.project,
+                "power_address": "%s:8443" % address,
+            },
+            pod_type="lxd",
+        )
+
+
+def get_cluster_group_ids(cluster_groups):
+    """Return the IDs in `cluster_groups`, independent of ordering."""
+    return sorted(
+        sorted(cluster.id for cluster in cluster_group)
+        for cluster_group in cluster_groups
+    )
+
+
+def make_lxd_pod(cluster):
+    """Make an LXD pod with 8 cores and 4096 MiB of memory in `cluster`."""
+    return factory.make_Pod(
+        pod_type="lxd", host=None, cores=8, memory=4096, cluster=cluster
+    )
 
 
 class TestVMClusterManager(MAASServerTestCase):
     def enable_rbac(self):
-        rbac = self.useFixture(RBACEnabled())
-        self.store = rbac.store
+        rbac_fixture = self.useFixture(RBACEnabled())
+        self.store = rbac_fixture.store
 
     def test_group_by_physical_cluster(self):
         user = factory.make_User()
@@ -25,21 +69,14 @@ class TestVMClusterManager(MAASServerTestCase):
             for _ in range(3)
         ]
 
-        for i, cluster_group in enumerate(cluster_groups):
-            address_group = [factory.make_StaticIPAddress() for _ in range(3)]
-            for cluster in cluster_group:
-                for address in address_group:
-                    factory.make_Pod(
-                        cluster=cluster,
-                        parameters={
-                            "project": cluster.project,
-                            "power_address": "%s:8443" % address,
-                        },
-                        pod_type="lxd",
-                    )
+        for cluster_group in cluster_groups:
+            make_physical_cluster_pods(cluster_group)
 
         results = VMCluster.objects.group_by_physical_cluster(user)
-        self.assertCountEqual(results, cluster_groups)
+        self.assertEqual(
+            get_cluster_group_ids(results),
+            get_cluster_group_ids(cluster_groups),
+        )
 
     def test_group_by_physical_cluster_with_rbac(self):
         self.enable_rbac()
@@ -65,22 +102,38 @@ class TestVMClusterManager(MAASServerTestCase):
             view_all_cluster_group,
             other_cluster_group,
         ]
-        for i, cluster_group in enumerate(cluster_groups):
-            address_group = [factory.make_StaticIPAddress() for _ in range(3)]
-            for cluster in cluster_group:
-                for address in address_group:
-                    factory.make_Pod(
-                        cluster=cluster,
-                        parameters={
-                            "project": cluster.project,
-                            "power_address": "%s:8443" % address,
-                        },
-                        pod_type="lxd",
-                    )
+        for cluster_group in cluster_groups:
+            make_physical_cluster_pods(cluster_group)
 
         results = VMCluster.objects.group_by_physical_cluster(user)
-        self.assertCountEqual(
-            results, [view_cluster_group, view_all_cluster_group]
+        self.assertEqual(
+            get_cluster_group_ids(results),
+            get_cluster_group_ids(
+                [view_cluster_group, view_all_cluster_group]
+            ),
+        )
+
+    def test_rbac_pool_lookups_are_cached_within_request(self):
+        self.enable_rbac()
+        user = factory.make_User()
+        pool = factory.make_ResourcePool()
+        self.store.add_pool(pool)
+        self.store.allow(user.username, pool, "view")
+        make_physical_cluster_pods(
+            [factory.make_VMCluster(pool=pool, pods=0) for _ in range(3)]
+        )
+        client = rbac.client
+        allowed_for_user = self.patch(
+            client,
+            "allowed_for_user",
+            MagicMock(wraps=client.allowed_for_user),
+        )
+
+        VMCluster.objects.group_by_physical_cluster(user)
+        list(VMCluster.objects.get_clusters(user, VMClusterPermission.view))
+
+        allowed_for_user.assert_called_once_with(
+            "resource-pool", user.username, "view", "view-all"
         )
 
     def test_get_cluster_or_404_returns_cluster(self):
@@ -128,7 +181,7 @@ class TestVMCluster(MAASServerTestCase):
     def test_hosts(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         pods = []
         for _ in range(0, 3):
             pods.append(
@@ -142,27 +195,27 @@ class TestVMCluster(MAASServerTestCase):
         for pod in pods:
             self.assertIn(pod, hosts)
 
+    def test_hosts_fetches_hints(self):
+        cluster = factory.make_VMCluster(pods=3)
+        queries, hints = count_queries(
+            lambda: [host.hints for host in cluster.hosts()]
+        )
+        self.assertEqual(3, len(hints))
+        self.assertEqual(1, queries)
+
     def test_allocated_total_resources(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         storage_total = 0
         storage_allocated = 0
 
         for _ in range(0, 3):
-            pod = factory.make_Pod(
-                pod_type="lxd",
-                host=None,
-                cores=8,
-                memory=4096,
-                cluster=cluster,
-            )
+            pod = make_lxd_pod(cluster)
             pool_name = factory.make_name("pool")
             pool1 = factory.make_PodStoragePool(pod=pod, name=pool_name)
             storage_total += pool1.storage
-            node = factory.make_Node(bmc=pod)
             vm = factory.make_VirtualMachine(
-                machine=node,
                 memory=1024,
                 pinned_cores=[0, 2],
                 hugepages_backed=False,
@@ -191,22 +244,14 @@ class TestVMCluster(MAASServerTestCase):
     def test_allocated_total_resources_shared_pool(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         storage_allocated = 0
-        storage_total = random.randint(10 * 1024 ** 3, 100 * 1024 ** 3)
+        storage_total = SHARED_POOL_SIZE
         pool_name = factory.make_name("pool")
 
         for _ in range(0, 3):
-            pod = factory.make_Pod(
-                pod_type="lxd",
-                host=None,
-                cores=8,
-                memory=4096,
-                cluster=cluster,
-            )
-            node = factory.make_Node(bmc=pod)
+            pod = make_lxd_pod(cluster)
             vm = factory.make_VirtualMachine(
-                machine=node,
                 memory=1024,
                 pinned_cores=[0, 2],
                 hugepages_backed=False,
@@ -218,11 +263,10 @@ class TestVMCluster(MAASServerTestCase):
                 pool_type="ceph",
                 storage=storage_total,
             )
-            disk_size = random.randint(1 * 1024 ** 3, storage_total // 3)
             factory.make_VirtualMachineDisk(
-                vm=vm, backing_pool=pool1, size=disk_size
+                vm=vm, backing_pool=pool1, size=SHARED_DISK_SIZE
             )
-            storage_allocated += disk_size
+            storage_allocated += SHARED_DISK_SIZE
 
         resources = cluster.total_resources()
         self.assertEqual(resources.cores.allocated, 6)
@@ -246,25 +290,17 @@ class TestVMCluster(MAASServerTestCase):
     def test_allocated_total_resources_mixed_pool(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         storage_shared_allocated = 0
-        storage_shared_total = random.randint(10 * 1024 ** 3, 100 * 1024 ** 3)
+        storage_shared_total = SHARED_POOL_SIZE
         storage_nonshared_allocated = 0
         storage_nonshared_total = 0
         pool_shared_name = factory.make_name("pool-ceph")
         pool_nonshared_name = factory.make_name("pool-lvm")
 
         for _ in range(0, 3):
-            pod = factory.make_Pod(
-                pod_type="lxd",
-                host=None,
-                cores=8,
-                memory=4096,
-                cluster=cluster,
-            )
-            node = factory.make_Node(bmc=pod)
+            pod = make_lxd_pod(cluster)
             vm = factory.make_VirtualMachine(
-                machine=node,
                 memory=1024,
                 pinned_cores=[0, 2],
                 hugepages_backed=False,
@@ -276,22 +312,21 @@ class TestVMCluster(MAASServerTestCase):
                 pool_type="ceph",
                 storage=storage_shared_total,
             )
-            disk_size = random.randint(
-                1 * 1024 ** 3, storage_shared_total // 3
-            )
             factory.make_VirtualMachineDisk(
-                vm=vm, backing_pool=pool1, size=disk_size
+                vm=vm, backing_pool=pool1, size=SHARED_DISK_SIZE
             )
-            storage_shared_allocated += disk_size
+            storage_shared_allocated += SHARED_DISK_SIZE
             pool2 = factory.make_PodStoragePool(
-                pod=pod, name=pool_nonshared_name, pool_type="lvm"
+                pod=pod,
+                name=pool_nonshared_name,
+                pool_type="lvm",
+                storage=LOCAL_POOL_SIZE,
             )
             storage_nonshared_total += pool2.storage
-            disk_size = random.randint(1 * 1024 ** 3, pool2.storage)
             factory.make_VirtualMachineDisk(
-                vm=vm, backing_pool=pool2, size=disk_size
+                vm=vm, backing_pool=pool2, size=LOCAL_DISK_SIZE
             )
-            storage_nonshared_allocated += disk_size
+            storage_nonshared_allocated += LOCAL_DISK_SIZE
 
         resources = cluster.total_resources()
         self.assertEqual(resources.cores.allocated, 6)
@@ -338,16 +373,9 @@ class TestVMCluster(MAASServerTestCase):
     def test_no_allocated_total_resources(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         for _ in range(0, 3):
-            pod = factory.make_Pod(
-                pod_type="lxd",
-                host=None,
-                cores=8,
-                memory=4096,
-                cluster=cluster,
-            )
-            factory.make_Node(bmc=pod)
+            make_lxd_pod(cluster)
 
         resources = cluster.total_resources()
         self.assertEqual(resources.cores.allocated, 0)
@@ -359,10 +387,19 @@ class TestVMCluster(MAASServerTestCase):
         self.assertEqual(resources.storage.allocated, 0)
         self.assertEqual(resources.storage.free, 0)
 
+    def test_total_resources_skips_detailed_resources(self):
+        cluster = factory.make_VMCluster(pods=3, vms=1)
+        mock_update_detailed = self.patch(
+            virtualmachine_module, "_update_detailed_resource_counters"
+        )
+        resources = cluster.total_resources()
+        self.assertEqual(resources.vmhost_count, 3)
+        mock_update_detailed.assert_not_called()
+
     def test_no_hosts_total_resources(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         resources = cluster.total_resources()
         self.assertEqual(resources.cores.allocated, 0)
         self.assertEqual(resources.cores.free, 0)
@@ -376,25 +413,17 @@ class TestVMCluster(MAASServerTestCase):
     def test_get_storage_pools(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         storage_shared_allocated = 0
-        storage_shared_total = random.randint(10 * 1024 ** 3, 100 * 1024 ** 3)
+        storage_shared_total = SHARED_POOL_SIZE
         storage_nonshared_allocated = 0
         storage_nonshared_total = 0
         pool_shared_name = factory.make_name("pool-ceph")
         pool_nonshared_name = factory.make_name("pool-lvm")
 
         for _ in range(0, 3):
-            pod = factory.make_Pod(
-                pod_type="lxd",
-                host=None,
-                cores=8,
-                memory=4096,
-                cluster=cluster,
-            )
-            node = factory.make_Node(bmc=pod)
+            pod = make_lxd_pod(cluster)
             vm = factory.make_VirtualMachine(
-                machine=node,
                 memory=1024,
                 pinned_cores=[0, 2],
                 hugepages_backed=False,
@@ -406,22 +435,21 @@ class TestVMCluster(MAASServerTestCase):
                 pool_type="ceph",
                 storage=storage_shared_total,
             )
-            disk_size = random.randint(
-                1 * 1024 ** 3, storage_shared_total // 3
-            )
             factory.make_VirtualMachineDisk(
-                vm=vm, backing_pool=pool1, size=disk_size
+                vm=vm, backing_pool=pool1, size=SHARED_DISK_SIZE
             )
-            storage_shared_allocated += disk_size
+            storage_shared_allocated += SHARED_DISK_SIZE
             pool2 = factory.make_PodStoragePool(
-                pod=pod, name=pool_nonshared_name, pool_type="lvm"
+                pod=pod,
+                name=pool_nonshared_name,
+                pool_type="lvm",
+                storage=LOCAL_POOL_SIZE,
             )
             storage_nonshared_total += pool2.storage
-            disk_size = random.randint(1 * 1024 ** 3, pool2.storage)
             factory.make_VirtualMachineDisk(
-                vm=vm, backing_pool=pool2, size=disk_size
+                vm=vm, backing_pool=pool2, size=LOCAL_DISK_SIZE
             )
-            storage_nonshared_allocated += disk_size
+            storage_nonshared_allocated += LOCAL_DISK_SIZE
 
         cluster_pools = cluster.storage_pools()
         self.assertEqual(cluster_pools[pool_nonshared_name].shared, False)
@@ -446,20 +474,12 @@ class TestVMCluster(MAASServerTestCase):
     def test_virtual_machines(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         expected_vms = []
         for _ in range(0, 3):
-            pod = factory.make_Pod(
-                pod_type="lxd",
-                host=None,
-                cores=8,
-                memory=4096,
-                cluster=cluster,
-            )
-            node = factory.make_Node(bmc=pod)
+            pod = make_lxd_pod(cluster)
             expected_vms.append(
                 factory.make_VirtualMachine(
-                    machine=node,
                     memory=1024,
                     pinned_cores=[0, 2],
                     hugepages_backed=False,
@@ -472,20 +492,13 @@ class TestVMCluster(MAASServerTestCase):
     def test_virtual_machines_hosts_no_vms(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         for _ in range(0, 3):
-            pod = factory.make_Pod(
-                pod_type="lxd",
-                host=None,
-                cores=8,
-                memory=4096,
-                cluster=cluster,
-            )
-            factory.make_Node(bmc=pod)
+            make_lxd_pod(cluster)
         self.assertEqual(list(cluster.virtual_machines()), [])
 
     def test_virtual_machines_no_hosts(self):
         cluster_name = factory.make_name("name")
         project = factory.make_name("project")
-        cluster = VMCluster(name=cluster_name, project=project)
+        cluster = VMCluster.objects.create(name=cluster_name, project=project)
         self.assertEqual(list(cluster.virtual_machines()), [])
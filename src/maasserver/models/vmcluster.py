@@ -166,12 +166,19 @@ class VMCluster(CleanSave, TimestampedModel):
     def hosts(self):
         from maasserver.models.bmc import Pod
 
-        return Pod.objects.filter(hints__cluster=self.id)
+        return Pod.objects.filter(hints__cluster=self.id).select_related(
+            "hints"
+        )
 
     def total_resources(self):
         from maasserver.models.virtualmachine import get_vm_host_resources
 
-        resources = [get_vm_host_resources(host) for host in self.hosts()]
+        # Only the per-host totals are aggregated, so skip the per-NUMA node
+        # details which would cost several extra queries per host.
+        resources = [
+            get_vm_host_resources(host, detailed=False)
+            for host in self.hosts()
+        ]
         if not resources:
             return VMClusterResources()
 
@@ -14,6 +14,7 @@ from maasserver.models import user
 from maasserver.models.config import Config
 from maasserver.rbac import FakeRBACClient, rbac
 from maasserver.testing.factory import factory
+from maasserver.utils.certificates import clear_maas_uuid_cache
 
 
 class PackageRepositoryFixture(fixtures.Fixture):
@@ -88,6 +89,14 @@ class RBACClearFixture(fixtures.Fixture):
         self.addCleanup(rbac.clear)
 
 
+class MAASUUIDClearFixture(fixtures.Fixture):
+    """Fixture that clears the cached MAAS UUID between tests."""
+
+    def _setUp(self):
+        clear_maas_uuid_cache()
+        self.addCleanup(clear_maas_uuid_cache)
+
+
 class RBACForceOffFixture(fixtures.Fixture):
     """Fixture that ensures RBAC is off and no query is performed.
 
@@ -28,6 +28,7 @@ from maasserver.fields import register_mac_type
 from maasserver.models import signals
 from maasserver.testing.fixtures import (
     IntroCompletedFixture,
+    MAASUUIDClearFixture,
     PackageRepositoryFixture,
     RBACClearFixture,
 )
@@ -97,6 +98,8 @@ class MAASRegionTestCaseBase(PostCommitHooksTestMixin):
 
         # Always clear the RBAC thread-local between tests.
         self.useFixture(RBACClearFixture())
+        # The MAAS UUID is cached per process, but each test has its own.
+        self.useFixture(MAASUUIDClearFixture())
 
         # XXX: allenap bug=1427628 2015-03-03: This should not be here.
         self.useFixture(IntroCompletedFixture())
@@ -3,8 +3,9 @@
 
 
 import random
+from unittest.mock import MagicMock, sentinel
 
-from twisted.internet.defer import succeed
+from twisted.internet.defer import gatherResults, succeed
 
 from maasserver import vmhost as vmhost_module
 from maasserver.enum import BMC_TYPE
@@ -17,6 +18,7 @@ from maasserver.testing.testcase import (
 )
 from maasserver.utils.threads import deferToDatabase
 from maastesting.crochet import wait_for
+from metadataserver.models import NodeKey
 from provisioningserver.drivers.pod import (
     DiscoveredCluster,
     DiscoveredPod,
@@ -44,8 +46,8 @@ def make_lxd_pod_info(url=None):
     }
 
 
-def fake_pod_discovery(testcase):
-    discovered_pod = DiscoveredPod(
+def make_discovered_pod(**kwargs):
+    return DiscoveredPod(
         architectures=["amd64/generic"],
         cores=random.randint(2, 4),
         memory=random.randint(2048, 4096),
@@ -67,75 +69,49 @@ def fake_pod_discovery(testcase):
             )
             for _ in range(3)
         ],
-    )
-    discovered_rack_1 = factory.make_RackController()
-    discovered_rack_2 = factory.make_RackController()
-    failed_rack = factory.make_RackController()
-    testcase.patch(vmhost_module, "post_commit_do")
-    testcase.patch(vmhost_module, "discover_pod").return_value = (
-        {
-            discovered_rack_1.system_id: discovered_pod,
-            discovered_rack_2.system_id: discovered_pod,
-        },
-        {failed_rack.system_id: factory.make_exception()},
-    )
-    return (
-        discovered_pod,
-        [discovered_rack_1, discovered_rack_2],
-        [failed_rack],
+        **kwargs,
     )
 
 
-def fake_cluster_discovery(testcase):
-    discovered_cluster = DiscoveredCluster(
+def make_discovered_cluster():
+    return DiscoveredCluster(
         name=factory.make_name("cluster"),
         project=factory.make_name("project"),
         pods=[
-            DiscoveredPod(
-                name=factory.make_name("pod"),
-                architectures=["amd64/generic"],
-                cores=random.randint(2, 4),
-                memory=random.randint(2048, 4096),
-                local_storage=random.randint(1024, 1024 * 1024),
-                cpu_speed=random.randint(2048, 4048),
-                hints=DiscoveredPodHints(
-                    cores=random.randint(2, 4),
-                    memory=random.randint(1024, 4096),
-                    local_storage=random.randint(1024, 1024 * 1024),
-                    cpu_speed=random.randint(2048, 4048),
-                ),
-                storage_pools=[
-                    DiscoveredPodStoragePool(
-                        id=factory.make_name("pool_id"),
-                        name=factory.make_name("name"),
-                        type=factory.make_name("type"),
-                        path="/var/lib/path/%s" % factory.make_name("path"),
-                        storage=random.randint(1024, 1024 * 1024),
-                    )
-                    for _ in range(3)
-                ],
-                clustered=True,
-            )
+            make_discovered_pod(name=factory.make_name("pod"), clustered=True)
             for _ in range(3)
         ],
         pod_addresses=["https://lxd-%d" % i for i in range(3)],
     )
+
+
+def fake_discovery(testcase, discovered_pod):
     discovered_rack_1 = factory.make_RackController()
     discovered_rack_2 = factory.make_RackController()
     failed_rack = factory.make_RackController()
     testcase.patch(vmhost_module, "post_commit_do")
     testcase.patch(vmhost_module, "discover_pod").return_value = (
         {
-            discovered_rack_1.system_id: discovered_cluster.pods[0],
-            discovered_rack_2.system_id: discovered_cluster.pods[0],
+            discovered_rack_1.system_id: discovered_pod,
+            discovered_rack_2.system_id: discovered_pod,
         },
         {failed_rack.system_id: factory.make_exception()},
     )
-    return (
-        discovered_cluster,
-        [discovered_rack_1, discovered_rack_2],
-        [failed_rack],
+    return [discovered_rack_1, discovered_rack_2], [failed_rack]
+
+
+def fake_pod_discovery(testcase):
+    discovered_pod = make_discovered_pod()
+    discovered_racks, failed_racks = fake_discovery(testcase, discovered_pod)
+    return discovered_pod, discovered_racks, failed_racks
+
+
+def fake_cluster_discovery(testcase):
+    discovered_cluster = make_discovered_cluster()
+    discovered_racks, failed_racks = fake_discovery(
+        testcase, discovered_cluster.pods[0]
     )
+    return discovered_cluster, discovered_racks, failed_racks
 
 
 class TestDiscoverAndSyncVMHost(MAASServerTestCase):
@@ -165,14 +141,17 @@ class TestDiscoverAndSyncVMHost(MAASServerTestCase):
         self.assertEqual(vmhost.power_type, "virsh")
         self.assertEqual(vmhost.power_parameters, power_parameters)
         self.assertEqual(vmhost.ip_address.ip, pod_info["ip_address"])
+        relations = vmhost.routable_rack_relationships.select_related(
+            "rack_controller"
+        )
         routable_racks = [
             relation.rack_controller
-            for relation in vmhost.routable_rack_relationships.all()
+            for relation in relations
             if relation.routable
         ]
         not_routable_racks = [
             relation.rack_controller
-            for relation in vmhost.routable_rack_relationships.all()
+            for relation in relations
             if not relation.routable
         ]
         self.assertCountEqual(routable_racks, discovered_racks)
@@ -212,8 +191,13 @@ class TestDiscoverAndSyncVMHostAsync(MAASTransactionServerTestCase):
         vmhost_module.discover_pod.return_value = succeed(
             vmhost_module.discover_pod.return_value
         )
-        zone = await deferToDatabase(factory.make_Zone)
-        pod_info = await deferToDatabase(make_pod_info)
+        zone, user = await gatherResults(
+            [
+                deferToDatabase(factory.make_Zone),
+                deferToDatabase(factory.make_User),
+            ]
+        )
+        pod_info = make_pod_info()
         power_parameters = {"power_address": pod_info["power_address"]}
         orig_vmhost = await deferToDatabase(
             factory.make_Pod,
@@ -221,7 +205,6 @@ class TestDiscoverAndSyncVMHostAsync(MAASTransactionServerTestCase):
             pod_type=pod_info["type"],
             parameters=power_parameters,
         )
-        user = await deferToDatabase(factory.make_User)
         vmhost = await vmhost_module.discover_and_sync_vmhost_async(
             orig_vmhost, user
         )
@@ -238,14 +221,17 @@ class TestDiscoverAndSyncVMHostAsync(MAASTransactionServerTestCase):
         self.assertEqual(vmhost.ip_address.ip, pod_info["ip_address"])
 
         def validate_rack_routes():
+            relations = vmhost.routable_rack_relationships.select_related(
+                "rack_controller"
+            )
             routable_racks = [
                 relation.rack_controller
-                for relation in vmhost.routable_rack_relationships.all()
+                for relation in relations
                 if relation.routable
             ]
             not_routable_racks = [
                 relation.rack_controller
-                for relation in vmhost.routable_rack_relationships.all()
+                for relation in relations
                 if not relation.routable
             ]
             self.assertCountEqual(routable_racks, discovered_racks)
@@ -260,7 +246,7 @@ class TestDiscoverAndSyncVMHostAsync(MAASTransactionServerTestCase):
         self.patch(vmhost_module, "discover_pod").return_value = succeed(
             ({}, {failed_rack.system_id: exc})
         )
-        pod_info = await deferToDatabase(make_pod_info)
+        pod_info = make_pod_info()
         power_parameters = {"power_address": pod_info["power_address"]}
         vmhost = yield deferToDatabase(
             factory.make_Pod,
@@ -461,7 +447,8 @@ class TestSyncVMCluster(MAASServerTestCase):
         )
         self.assertEqual(updated_vmhost.name, vmhosts[0].name)
         self.assertCountEqual(
-            cluster.hosts(), updated_vmhost.hints.cluster.hosts()
+            cluster.hosts().values_list("id", flat=True),
+            updated_vmhost.hints.cluster.hosts().values_list("id", flat=True),
         )
 
 
@@ -485,8 +472,13 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
         vmhost_module.discover_pod.return_value = succeed(
             (successes, failures)
         )
-        zone = await deferToDatabase(factory.make_Zone)
-        pod_info = await deferToDatabase(make_pod_info)
+        zone, user = await gatherResults(
+            [
+                deferToDatabase(factory.make_Zone),
+                deferToDatabase(factory.make_User),
+            ]
+        )
+        pod_info = make_pod_info()
         power_parameters = {"power_address": pod_info["power_address"]}
         orig_vmhost = await deferToDatabase(
             factory.make_Pod,
@@ -494,7 +486,6 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
             pod_type=pod_info["type"],
             parameters=power_parameters,
         )
-        user = await deferToDatabase(factory.make_User)
         vmhost = await vmhost_module.discover_and_sync_vmhost_async(
             orig_vmhost, user
         )
@@ -519,8 +510,13 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
         vmhost_module.discover_pod.return_value = succeed(
             (successes, failures)
         )
-        zone = await deferToDatabase(factory.make_Zone)
-        pod_info = await deferToDatabase(make_pod_info)
+        zone, user = await gatherResults(
+            [
+                deferToDatabase(factory.make_Zone),
+                deferToDatabase(factory.make_User),
+            ]
+        )
+        pod_info = make_pod_info()
         power_parameters = {"power_address": pod_info["power_address"]}
         orig_vmhost = await deferToDatabase(
             factory.make_Pod,
@@ -528,13 +524,14 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
             pod_type=pod_info["type"],
             parameters=power_parameters,
         )
-        user = await deferToDatabase(factory.make_User)
         vmhost = await vmhost_module.discover_and_sync_vmhost_async(
             orig_vmhost, user
         )
 
         def _get_cluster_pod_names():
-            hints = PodHints.objects.filter(cluster=vmhost.hints.cluster)
+            hints = PodHints.objects.filter(
+                cluster=vmhost.hints.cluster
+            ).select_related("pod")
             return [hint.pod.name for hint in hints]
 
         pod_names = await deferToDatabase(_get_cluster_pod_names)
@@ -557,8 +554,13 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
         vmhost_module.discover_pod.return_value = succeed(
             (successes, failures)
         )
-        zone = await deferToDatabase(factory.make_Zone)
-        pod_info = await deferToDatabase(make_pod_info)
+        zone, user = await gatherResults(
+            [
+                deferToDatabase(factory.make_Zone),
+                deferToDatabase(factory.make_User),
+            ]
+        )
+        pod_info = make_pod_info()
         power_parameters = {"power_address": pod_info["power_address"]}
         orig_vmhost = await deferToDatabase(
             factory.make_Pod,
@@ -566,7 +568,6 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
             pod_type=pod_info["type"],
             parameters=power_parameters,
         )
-        user = await deferToDatabase(factory.make_User)
         vmhost = await vmhost_module.discover_and_sync_vmhost_async(
             orig_vmhost, user
         )
@@ -594,8 +595,13 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
         vmhost_module.discover_pod.return_value = succeed(
             (successes, failures)
         )
-        zone = await deferToDatabase(factory.make_Zone)
-        pod_info = await deferToDatabase(make_pod_info)
+        zone, user = await gatherResults(
+            [
+                deferToDatabase(factory.make_Zone),
+                deferToDatabase(factory.make_User),
+            ]
+        )
+        pod_info = make_pod_info()
         power_parameters = {"power_address": pod_info["power_address"]}
         orig_vmhost = await deferToDatabase(
             factory.make_Pod,
@@ -603,7 +609,6 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
             pod_type=pod_info["type"],
             parameters=power_parameters,
         )
-        user = await deferToDatabase(factory.make_User)
         vmhost = await vmhost_module.discover_and_sync_vmhost_async(
             orig_vmhost, user
         )
@@ -632,8 +637,13 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
         vmhost_module.discover_pod.return_value = succeed(
             (successes, failures)
         )
-        zone = await deferToDatabase(factory.make_Zone)
-        pool = await deferToDatabase(factory.make_ResourcePool)
+        zone, pool, admin = await gatherResults(
+            [
+                deferToDatabase(factory.make_Zone),
+                deferToDatabase(factory.make_ResourcePool),
+                deferToDatabase(factory.make_admin),
+            ]
+        )
         cluster = await deferToDatabase(
             factory.make_VMCluster,
             name=discovered_cluster.name,
@@ -655,7 +665,6 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
             )
             for i, pod in enumerate(discovered_cluster.pods)
         ]
-        admin = await deferToDatabase(factory.make_admin)
         updated_vmhost = await vmhost_module.sync_vmcluster_async(
             discovered_cluster,
             ({"cluster": discovered_cluster},),
@@ -666,7 +675,51 @@ class TestSyncVMClusterAsync(MAASTransactionServerTestCase):
 
         def _compare_cluster():
             self.assertCountEqual(
-                cluster.hosts(), updated_vmhost.hints.cluster.hosts()
+                cluster.hosts().values_list("id", flat=True),
+                updated_vmhost.hints.cluster.hosts().values_list(
+                    "id", flat=True
+                ),
             )
 
         await deferToDatabase(_compare_cluster)
+
+
+class TestRequestCommissioningResults(MAASTransactionServerTestCase):
+
+    wait_for_reactor = wait_for(30)
+
+    @wait_for_reactor
+    async def test_sends_results_for_each_node(self):
+        def make_pod_with_nodes():
+            pod = factory.make_Pod(pod_type="lxd")
+            nodes = [factory.make_Node() for _ in range(3)]
+            for node in nodes:
+                pod.hints.nodes.add(node)
+            return pod, nodes
+
+        pod, nodes = await deferToDatabase(make_pod_with_nodes)
+        self.patch(
+            vmhost_module, "getClientFromIdentifiers"
+        ).return_value = succeed(sentinel.client)
+        mock_send = self.patch(vmhost_module, "send_pod_commissioning_results")
+        mock_send.return_value = succeed(None)
+        mock_defer = self.patch(
+            vmhost_module, "deferToDatabase", MagicMock(wraps=deferToDatabase)
+        )
+
+        await vmhost_module.request_commissioning_results(pod)
+
+        def get_token_keys():
+            return {
+                node.system_id: NodeKey.objects.get_token_for_node(node).key
+                for node in nodes
+            }
+
+        token_keys = await deferToDatabase(get_token_keys)
+        self.assertEqual(
+            {call[0][4]: call[0][7] for call in mock_send.call_args_list},
+            token_keys,
+        )
+        # Nodes, client identifiers and tokens are fetched in two hops,
+        # regardless of the number of nodes.
+        self.assertEqual(mock_defer.call_count, 2)
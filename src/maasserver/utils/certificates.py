@@ -1,6 +1,38 @@
 from maasserver.models import Config, RegionController
 from provisioningserver.certificates import Certificate
 
+_maas_uuid = None
+
+
+def get_maas_uuid():
+    """Return the UUID of this MAAS deployment.
+
+    The UUID doesn't change once it's set, so it's cached for the life of the
+    process once it's been read from the database. A newly created UUID isn't
+    cached, since the transaction that created it may still be rolled back.
+    The cache is cleared whenever the `uuid` config is updated.
+    """
+    global _maas_uuid
+    if _maas_uuid is None:
+        maas_uuid = Config.objects.get_config("uuid")
+        if maas_uuid is None:
+            return RegionController.objects.get_or_create_uuid()
+        _maas_uuid = maas_uuid
+    return _maas_uuid
+
+
+def clear_maas_uuid_cache():
+    """Forget the cached MAAS UUID."""
+    global _maas_uuid
+    _maas_uuid = None
+
+
+def _clear_maas_uuid_cache(sender, instance, created, **kwargs):
+    clear_maas_uuid_cache()
+
+
+Config.objects.config_changed_connect("uuid", _clear_maas_uuid_cache)
+
 
 def get_maas_client_cn(object_name):
     """Get a CN suitable for a client certificate.
@@ -25,13 +57,10 @@ def generate_certificate(cn) -> Certificate:
     return Certificate.generate(
         cn,
         organization_name="MAAS",
-        organizational_unit_name=RegionController.objects.get_or_create_uuid(),
+        organizational_unit_name=get_maas_uuid(),
     )
 
 
 def certificate_generated_by_this_maas(certificate):
     """Return whether the certificate was generated by this MAAS deployment."""
-    return (
-        certificate.o() == "MAAS"
-        and certificate.ou() == RegionController.objects.get_or_create_uuid()
-    )
+    return certificate.o() == "MAAS" and certificate.ou() == get_maas_uuid()
@@ -4,12 +4,15 @@ from uuid import uuid1
 from OpenSSL import crypto
 
 from maasserver.models import Config
+from maasserver.testing.fixtures import MAASUUIDClearFixture
 from maasserver.testing.testcase import MAASServerTestCase
 from maasserver.utils.certificates import (
     certificate_generated_by_this_maas,
     generate_certificate,
     get_maas_client_cn,
+    get_maas_uuid,
 )
+from maastesting.djangotestcase import count_queries
 from provisioningserver.certificates import Certificate
 
 
@@ -24,6 +27,40 @@ class TestGetMAASClientCN(MAASServerTestCase):
         self.assertEqual("my-maas", get_maas_client_cn(None))
 
 
+class TestGetMAASUUID(MAASServerTestCase):
+    def test_cached(self):
+        maas_uuid = str(uuid1())
+        Config.objects.set_config("uuid", maas_uuid)
+        self.assertEqual(maas_uuid, get_maas_uuid())
+        queries, result = count_queries(get_maas_uuid)
+        self.assertEqual(maas_uuid, result)
+        self.assertEqual(0, queries)
+
+    def test_cache_cleared_on_config_change(self):
+        Config.objects.set_config("uuid", str(uuid1()))
+        get_maas_uuid()
+        maas_uuid = str(uuid1())
+        Config.objects.set_config("uuid", maas_uuid)
+        self.assertEqual(maas_uuid, get_maas_uuid())
+
+    def test_created_uuid_not_cached(self):
+        Config.objects.filter(name="uuid").delete()
+        maas_uuid = get_maas_uuid()
+        # Simulate the creating transaction being rolled back.
+        Config.objects.filter(name="uuid").delete()
+        self.assertNotEqual(maas_uuid, get_maas_uuid())
+
+    def test_cache_cleared_between_tests(self):
+        Config.objects.set_config("uuid", str(uuid1()))
+        get_maas_uuid()
+        fixture = MAASUUIDClearFixture()
+        fixture.setUp()
+        fixture.cleanUp()
+        maas_uuid = str(uuid1())
+        Config.objects.filter(name="uuid").update(value=maas_uuid)
+        self.assertEqual(maas_uuid, get_maas_uuid())
+
+
 class TestGenerateCertificate(MAASServerTestCase):
     def setUp(self):
         super().setUp()
@@ -70,3 +107,11 @@ class TestCertificateGeneratedByThisMAAS(MAASServerTestCase):
             organizational_unit_name="not-this-maas",
         )
         self.assertFalse(certificate_generated_by_this_maas(non_maas_cert))
+
+    def test_non_maas_certificate_no_queries(self):
+        non_maas_cert = Certificate.generate("mycn")
+        queries, result = count_queries(
+            certificate_generated_by_this_maas, non_maas_cert
+        )
+        self.assertFalse(result)
+        self.assertEqual(0, queries)
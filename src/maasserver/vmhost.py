@@ -29,14 +29,25 @@ from provisioningserver.events import EVENT_TYPES
 @inlineCallbacks
 def request_commissioning_results(pod):
     """Request commissioning results from machines associated with the Pod."""
-    nodes = yield deferToDatabase(lambda: list(pod.hints.nodes.all()))
-    # libvirt Pods don't create machines for the host.
+
+    def get_nodes_and_client_identifiers():
+        nodes = list(pod.hints.nodes.all())
+        # libvirt Pods don't create machines for the host.
+        if not nodes:
+            return nodes, None
+        return nodes, pod.get_client_identifiers()
+
+    def get_tokens(nodes):
+        return [NodeKey.objects.get_token_for_node(node) for node in nodes]
+
+    nodes, client_identifiers = yield deferToDatabase(
+        get_nodes_and_client_identifiers
+    )
     if not nodes:
         return pod
-    client_identifiers = yield deferToDatabase(pod.get_client_identifiers)
     client = yield getClientFromIdentifiers(client_identifiers)
-    for node in nodes:
-        token = yield deferToDatabase(NodeKey.objects.get_token_for_node, node)
+    tokens = yield deferToDatabase(get_tokens, nodes)
+    for node, token in zip(nodes, tokens):
         try:
             yield send_pod_commissioning_results(
                 client,
@@ -320,13 +320,17 @@ class Handler(metaclass=HandlerMetaclass):
         """
         return obj
 
-    def get_object(self, params, permission=None):
-        """Get object by using the `pk` in `params`."""
+    def _get_pk(self, params):
+        """Return the `pk` in `params`, raising if it's missing."""
         if self._meta.pk not in params:
             raise HandlerValidationError(
                 {self._meta.pk: ["This field is required"]}
             )
-        pk = params[self._meta.pk]
+        return params[self._meta.pk]
+
+    def get_object(self, params, permission=None):
+        """Get object by using the `pk` in `params`."""
+        pk = self._get_pk(params)
         try:
             obj = self.get_queryset(for_list=False).get(**{self._meta.pk: pk})
         except self._meta.object_class.DoesNotExist:
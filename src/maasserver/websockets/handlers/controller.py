@@ -19,10 +19,14 @@ from django.db.models import (
 
 from maasserver.config import RegionConfiguration
 from maasserver.forms import ControllerForm
-from maasserver.models import Config, Controller, Event, RackController, VLAN
+from maasserver.models import Config, Controller, Event, VLAN
 from maasserver.models.controllerinfo import get_target_version
 from maasserver.permissions import NodePermission
-from maasserver.websockets.base import HandlerError, HandlerPermissionError
+from maasserver.websockets.base import (
+    HandlerDoesNotExistError,
+    HandlerError,
+    HandlerPermissionError,
+)
 from maasserver.websockets.handlers.machine import MachineHandler
 from maasserver.websockets.handlers.node import node_prefetch
 
@@ -195,14 +199,24 @@ class ControllerHandler(MachineHandler):
 
     def check_images(self, params):
         """Get the image sync statuses of requested controllers."""
+        system_ids = [self._get_pk(param) for param in params]
+        # Fetch all the requested controllers in a single query, rather than
+        # one (heavily prefetched) get_object() per controller.
+        controllers = {
+            controller.system_id: controller
+            for controller in Controller.controllers.get_nodes(
+                self.user, NodePermission.view, ids=system_ids
+            )
+        }
         result = {}
-        for node in [self.get_object(param) for param in params]:
+        for system_id in system_ids:
+            if system_id not in controllers:
+                raise HandlerDoesNotExistError(system_id)
             # We use a RackController method; without the cast, it's a Node.
-            node = node.as_rack_controller()
-            if isinstance(node, RackController):
-                result[node.system_id] = (
-                    node.get_image_sync_status().replace("-", " ").title()
-                )
+            node = controllers[system_id].as_rack_controller()
+            result[system_id] = (
+                node.get_image_sync_status().replace("-", " ").title()
+            )
         return result
 
     def dehydrate_show_os_info(self, obj):
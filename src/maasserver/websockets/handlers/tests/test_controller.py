@@ -5,12 +5,13 @@
 from maasserver.config import RegionConfiguration
 from maasserver.enum import NODE_TYPE
 from maasserver.forms import ControllerForm
-from maasserver.models import Config, ControllerInfo, VLAN
+from maasserver.models import Config, ControllerInfo, RackController, VLAN
 from maasserver.testing.factory import factory
 from maasserver.testing.fixtures import RBACForceOffFixture
 from maasserver.testing.testcase import MAASServerTestCase
 from maasserver.websockets.base import (
     dehydrate_datetime,
+    HandlerDoesNotExistError,
     HandlerPermissionError,
 )
 from maasserver.websockets.handlers.controller import ControllerHandler
@@ -200,6 +201,34 @@ class TestControllerHandler(MAASServerTestCase):
             {node1.system_id: "Unknown", node2.system_id: "Unknown"}, data
         )
 
+    def test_check_images_raises_for_unknown_controller(self):
+        owner = factory.make_admin()
+        handler = ControllerHandler(owner, {}, None)
+        node = factory.make_RackController(owner=owner)
+        self.assertRaises(
+            HandlerDoesNotExistError,
+            handler.check_images,
+            [{"system_id": node.system_id}, {"system_id": "unknown"}],
+        )
+
+    def test_check_images_controller_lookup_num_queries_is_constant(self):
+        self.patch(
+            RackController, "get_image_sync_status"
+        ).return_value = "synced"
+        owner = factory.make_admin()
+        nodes = [factory.make_RackController(owner=owner) for _ in range(3)]
+        handler1 = ControllerHandler(owner, {}, None)
+        queries_one, _ = count_queries(
+            handler1.check_images, [{"system_id": nodes[0].system_id}]
+        )
+        handler2 = ControllerHandler(owner, {}, None)
+        queries_all, data = count_queries(
+            handler2.check_images,
+            [{"system_id": node.system_id} for node in nodes],
+        )
+        self.assertEqual({node.system_id: "Synced" for node in nodes}, data)
+        self.assertEqual(queries_one, queries_all)
+
     def test_dehydrate_show_os_info_returns_true(self):
         owner = factory.make_admin()
         rack = factory.make_RackController()
@@ -52,6 +52,11 @@ class TestDiscoveryHandler(MAASServerTestCase):
         }
         return data
 
+    def make_observer_interface(self):
+        """Return a rack interface to observe several discoveries."""
+        rack = factory.make_RackController()
+        return factory.make_Interface(node=rack)
+
     def test_get(self):
         user = factory.make_User()
         handler = DiscoveryHandler(user, {}, None)
@@ -64,8 +69,9 @@ class TestDiscoveryHandler(MAASServerTestCase):
     def test_list(self):
         user = factory.make_User()
         handler = DiscoveryHandler(user, {}, None)
-        factory.make_Discovery()
-        factory.make_Discovery()
+        iface = self.make_observer_interface()
+        factory.make_Discovery(interface=iface)
+        factory.make_Discovery(interface=iface)
         expected_discoveries = [
             self.dehydrate_discovery(discovery, for_list=True)
             for discovery in Discovery.objects.all()
@@ -76,11 +82,13 @@ class TestDiscoveryHandler(MAASServerTestCase):
         user = factory.make_User()
         handler = DiscoveryHandler(user, {}, None)
         now = datetime.now()
-        d0 = factory.make_Discovery(created=now)
-        d4 = factory.make_Discovery(created=(now + timedelta(days=4)))
-        d3 = factory.make_Discovery(created=(now + timedelta(days=3)))
-        d1 = factory.make_Discovery(created=(now + timedelta(days=1)))
-        d2 = factory.make_Discovery(created=(now + timedelta(days=2)))
+        iface = self.make_observer_interface()
+        d0, d4, d3, d1, d2 = (
+            factory.make_Discovery(
+                interface=iface, created=(now + timedelta(days=days))
+            )
+            for days in (0, 4, 3, 1, 2)
+        )
         # Test for the expected order independent of how the database
         # decided to sort.
         expected_discoveries = [
@@ -93,11 +101,13 @@ class TestDiscoveryHandler(MAASServerTestCase):
         user = factory.make_User()
         handler = DiscoveryHandler(user, {}, None)
         now = datetime.now()
-        factory.make_Discovery(created=now)
-        d4 = factory.make_Discovery(created=(now + timedelta(days=4)))
-        d3 = factory.make_Discovery(created=(now + timedelta(days=3)))
-        factory.make_Discovery(created=(now + timedelta(days=1)))
-        factory.make_Discovery(created=(now + timedelta(days=2)))
+        iface = self.make_observer_interface()
+        _, d4, d3, _, _ = (
+            factory.make_Discovery(
+                interface=iface, created=(now + timedelta(days=days))
+            )
+            for days in (0, 4, 3, 1, 2)
+        )
         first_seen = now + timedelta(days=2)
         first_seen = str(
             time.mktime(first_seen.timetuple()) + first_seen.microsecond / 1e6
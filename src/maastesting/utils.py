@@ -4,10 +4,11 @@
 """Testing utilities."""
 
 import codecs
+from functools import partial
 import os
 import re
 
-from testtools.content import Content
+from testtools.content import Content, DEFAULT_CHUNK_SIZE
 from testtools.content_type import UTF8_TEXT
 
 
@@ -29,18 +30,21 @@ def content_from_file(path):
 
     def iterate():
         fd.seek(0)
-        return iter(fd)
+        return iter(partial(fd.read, DEFAULT_CHUNK_SIZE), b"")
 
     return Content(UTF8_TEXT, iterate)
 
 
+re_word = re.compile(r"[^,;\s]+")
+
+
 def extract_word_list(string):
     """Return a list of words from a string.
 
     Words are any string of 1 or more characters, not including commas,
     semi-colons, or whitespace.
     """
-    return re.findall(r"[^,;\s]+", string)
+    return re_word.findall(string)
 
 
 # Some horrible binary data that could never, ever, under any encoding